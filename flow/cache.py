@@ -0,0 +1,55 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import List, Optional, Tuple
+from flow.parser import Task
+
+
+CACHE_VERSION = 4
+
+
+class PipelineCache:
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+            cache_dir = Path(cache_home) / 'flow'
+        self.cache_dir = Path(cache_dir)
+        self._entries = {}
+
+    def _entry(self, pipeline_file: str) -> Tuple[Path, tuple]:
+        # Entries are validated by content, so touching the file or
+        # checking it out again does not force a re-parse. The key is
+        # computed once per file so store() matches what load() checked.
+        if pipeline_file not in self._entries:
+            pipeline_path = Path(pipeline_file).resolve()
+            name = hashlib.sha1(str(pipeline_path).encode()).hexdigest()
+            digest = hashlib.blake2b(pipeline_path.read_bytes()).hexdigest()
+            self._entries[pipeline_file] = (self.cache_dir / f"{name}.pkl", (CACHE_VERSION, digest))
+        return self._entries[pipeline_file]
+
+    def load(self, pipeline_file: str) -> Optional[Tuple[List[Task], List[List[int]], List[int]]]:
+        cache_file, key = self._entry(pipeline_file)
+
+        try:
+            with open(cache_file, 'rb') as f:
+                cached_key, tasks, graph, in_degree = pickle.load(f)
+        except Exception:
+            return None
+
+        if cached_key != key:
+            return None
+
+        return tasks, graph, in_degree
+
+    def store(self, pipeline_file: str, tasks: List[Task], graph: List[List[int]], in_degree: List[int]):
+        cache_file, key = self._entry(pipeline_file)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, 'wb') as f:
+                pickle.dump((key, tasks, graph, in_degree), f, protocol=5)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            tmp_file.unlink(missing_ok=True)
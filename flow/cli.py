@@ -1,10 +1,11 @@
 import click
 import sys
 from pathlib import Path
-from logger import FlowLogger
-from parser import PipelineParser
-from scheduler import TaskScheduler
-from executor import TaskExecutor, TaskStatus
+from flow.cache import PipelineCache
+from flow.logger import FlowLogger
+from flow.parser import PipelineParser
+from flow.scheduler import TaskScheduler
+from flow.executor import STATE_FILE, TaskExecutor, read_state
 
 
 @click.group()
@@ -26,46 +27,32 @@ def run(pipeline_file, max_workers, retries, resume):
     logger.info(f"running {pipeline_file}")
     
     try:
-        parser = PipelineParser(logger)
-        tasks = parser.parse(pipeline_file)
-        
+        cache = PipelineCache()
+        cached = cache.load(pipeline_file)
         scheduler = TaskScheduler(logger)
-        execution_levels = scheduler.get_execution_order(tasks)
+        
+        if cached:
+            tasks, graph, in_degree = cached
+            logger.info(f"loaded {len(tasks)} tasks (cached)")
+        else:
+            parser = PipelineParser(logger)
+            tasks = parser.parse(pipeline_file)
+            
+            # One graph serves the cycle check, the cache and dispatch.
+            graph, in_degree = scheduler.get_graph_and_indegree(tasks)
+            if scheduler.detect_cycles(tasks, graph, in_degree):
+                raise ValueError("cyclic dependencies")
+            cache.store(pipeline_file, tasks, graph, in_degree)
         
         executor = TaskExecutor(logger, max_workers, retries)
         
         if resume:
             executor.load_state()
         
-        task_map = {task.id: task for task in tasks}
-        
-        total_failed = 0
-        for level_task_ids in execution_levels:
-            # Check dependencies before running level
-            blocked_tasks = []
-            for task_id in level_task_ids:
-                task = task_map[task_id]
-                for dep in task.depends_on:
-                    dep_result = executor.results.get(dep)
-                    if not dep_result or dep_result.status != TaskStatus.SUCCESS:
-                        logger.error(f"{task_id}: blocked by {dep}")
-                        blocked_tasks.append(task_id)
-                        break
-            
-            # Remove blocked tasks from this level
-            runnable_tasks = [task_id for task_id in level_task_ids if task_id not in blocked_tasks]
-            
-            if not runnable_tasks:
-                if blocked_tasks:
-                    continue  # Skip this level, all tasks blocked
-            
-            # Execute runnable tasks
-            if runnable_tasks:
-                level_tasks = [task_map[task_id] for task_id in runnable_tasks]
-                level_results = executor.execute_level(level_tasks)
-                
-                level_failed = sum(1 for r in level_results if r.status == TaskStatus.FAILED)
-                total_failed += level_failed
+        try:
+            total_failed = executor.run_all(tasks, graph, in_degree)
+        finally:
+            executor.close()
         
         if total_failed > 0:
             logger.error("failed")
@@ -83,19 +70,22 @@ def run(pipeline_file, max_workers, retries, resume):
 @cli.command()
 def status():
     """show task status"""
-    logger = FlowLogger()
-    
-    executor = TaskExecutor(logger)
-    if not executor.load_state():
-        logger.info("no previous run")
+    if not STATE_FILE.exists():
+        click.echo("no previous run")
         return
     
-    if not executor.results:
-        logger.info("no tasks found")
+    try:
+        states = read_state()
+    except OSError as e:
+        click.echo(f"failed: {e}", err=True)
+        sys.exit(1)
+    
+    if not states:
+        click.echo("no tasks found")
         return
     
-    for task_id, result in executor.results.items():
-        logger.info(f"{task_id}: {result.status.value}")
+    for task_id, task_state in states.items():
+        click.echo(f"{task_id}: {task_state['status']}")
 
 
 if __name__ == '__main__':
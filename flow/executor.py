@@ -1,11 +1,38 @@
+import errno
+import os
+import queue
+import re
+import selectors
+import shlex
+import shutil
 import subprocess
+import sys
 import concurrent.futures
+import threading
 import time
+from collections import Counter
 from enum import Enum
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Set
 from pathlib import Path
-import json
-from parser import Task
+from flow.parser import Task
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _dumps = lambda obj: json.dumps(obj).encode()
+    _loads = json.loads
+
+STATE_FILE = Path("flow_state.jsonl")
+
+# Anything that needs the shell to expand, redirect or chain commands.
+_SHELL_META = re.compile(r'[|&;<>()$`\\"\'*?\[\]{}#~=%!\n]')
+
+# Task output from all worker threads goes through one lock so lines
+# from parallel tasks never interleave mid-line.
+_stdout_lock = threading.Lock()
 
 
 class TaskStatus(Enum):
@@ -16,6 +43,28 @@ class TaskStatus(Enum):
     RETRYING = "retrying"
 
 
+# Identity checks and a plain dict lookup are much cheaper than Enum
+# equality and TaskStatus(value) on the per-task paths.
+_SUCCESS = TaskStatus.SUCCESS
+_STATUS_BY_VALUE = {status.value: status for status in TaskStatus}
+
+
+def read_state(state_file: Path = STATE_FILE) -> Dict[str, dict]:
+    # Latest record per task from the append-only state log. Needs no
+    # pipeline file, logger or executor, so `flow status` reads it directly.
+    states = {}
+    
+    with open(state_file, 'rb') as f:
+        for line in f:
+            try:
+                task_state = _loads(line)
+            except ValueError:
+                continue  # torn write from an interrupted run
+            states[task_state['id']] = task_state
+    
+    return states
+
+
 class TaskResult:
     def __init__(self, task_id: str):
         self.task_id = task_id
@@ -33,95 +82,180 @@ class TaskExecutor:
         self.max_workers = max_workers
         self.retries = retries
         self.results: Dict[str, TaskResult] = {}
-        self.state_file = Path("flow_state.json")
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.state_file = STATE_FILE
+        self._tty = sys.stdout.isatty()
+        self._argvs: Dict[str, Optional[List[str]]] = {}
+        self._executables: Dict[str, Optional[str]] = {}
+        self._resume_log = b''
+        self._log_q = queue.SimpleQueue()
+        self._log_lock = threading.Lock()
+        self._flusher = None
+        self._flush_interval = 0.5
+        self._status_counts = Counter({status.value: 0 for status in TaskStatus})
+        self._status_lock = threading.Lock()
+        self._watch_q = queue.SimpleQueue()
+        self._reader_lock = threading.Lock()
+        self._reader = None
+    
+    def _log_delta(self, result: TaskResult):
+        record = _dumps({
+            'id': result.task_id,
+            'status': result.status.value,
+            'attempts': result.attempts,
+            'start_time': result.start_time,
+            'end_time': result.end_time
+        })
+        
+        with self._log_lock:
+            if self._flusher is None:
+                # Start from a compacted copy of the resumed state (empty
+                # for a fresh run), swapped in atomically, then append.
+                self._replace_state(self._resume_log)
+                log_fh = open(self.state_file, 'ab')
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, args=(log_fh,), daemon=True
+                )
+                self._flusher.start()
+        
+        # Failures are written out right away so a crash right after one
+        # still leaves it in the log; successes can wait for the batch.
+        self._log_q.put((record + b'\n', result.status is not _SUCCESS))
+    
+    def _flush_loop(self, log_fh):
+        running = True
+        
+        while running:
+            batch = []
+            record = self._log_q.get()
+            deadline = time.monotonic() + self._flush_interval
+            
+            while record is not None:
+                data, urgent = record
+                batch.append(data)
+                if urgent:
+                    break
+                try:
+                    record = self._log_q.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            else:
+                running = False
+            
+            if batch:
+                log_fh.write(b''.join(batch))
+                log_fh.flush()
+                os.fsync(log_fh.fileno())
+        
+        log_fh.close()
     
-    def save_state(self):
-        state = {}
-        for task_id, result in self.results.items():
-            state[task_id] = {
-                'status': result.status.value,
-                'attempts': result.attempts,
-                'start_time': result.start_time,
-                'end_time': result.end_time
-            }
+    def _replace_state(self, data: bytes):
+        tmp_file = self.state_file.with_name(self.state_file.name + '.tmp')
         
-        with open(self.state_file, 'w') as f:
-            json.dump(state, f, indent=2)
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.replace(tmp_file, self.state_file)
+    
+    def close(self):
+        self.pool.shutdown(wait=True)
+        
+        with self._reader_lock:
+            if self._reader is not None:
+                self._watch_q.put(None)
+                os.write(self._wake_w, b'\0')
+                self._reader.join()
+                self._reader = None
+                self._selector.close()
+                os.close(self._wake_r)
+                os.close(self._wake_w)
+        
+        with self._log_lock:
+            if self._flusher is not None:
+                self._log_q.put(None)
+                self._flusher.join()
+                self._flusher = None
     
     def load_state(self) -> bool:
         if not self.state_file.exists():
             return False
         
         try:
-            with open(self.state_file, 'r') as f:
-                state = json.load(f)
+            states = read_state(self.state_file)
             
-            for task_id, task_state in state.items():
-                result = TaskResult(task_id)
-                result.status = TaskStatus(task_state['status'])
+            for task_state in states.values():
+                result = TaskResult(task_state['id'])
+                result.status = _STATUS_BY_VALUE[task_state['status']]
                 result.attempts = task_state['attempts']
                 result.start_time = task_state['start_time']
                 result.end_time = task_state['end_time']
-                self.results[task_id] = result
+                self.results[result.task_id] = result
             
-            self.logger.info(f"resumed {len(state)} tasks")
+            self._status_counts = Counter({status.value: 0 for status in TaskStatus})
+            self._status_counts.update(result.status.value for result in self.results.values())
+            self._resume_log = b''.join(_dumps(task_state) + b'\n' for task_state in states.values())
+            self.logger.info(f"resumed {len(self.results)} tasks")
             return True
             
         except Exception as e:
             self.logger.warning(f"resume failed: {e}")
             return False
     
-    def execute_task(self, task: Task) -> TaskResult:
-        if task.id not in self.results:
-            self.results[task.id] = TaskResult(task.id)
+    def _set_status(self, result: TaskResult, status: TaskStatus):
+        with self._status_lock:
+            self._status_counts[result.status.value] -= 1
+            result.status = status
+            self._status_counts[status.value] += 1
+    
+    def _get_result(self, task_id: str) -> TaskResult:
+        result = self.results.get(task_id)
         
-        result = self.results[task.id]
+        if result is None:
+            result = self.results[task_id] = TaskResult(task_id)
+            with self._status_lock:
+                self._status_counts[TaskStatus.PENDING.value] += 1
         
-        if result.status == TaskStatus.SUCCESS:
+        return result
+    
+    def execute_task(self, task: Task) -> TaskResult:
+        result = self._get_result(task.id)
+        
+        if result.status is _SUCCESS:
             return result
         
         max_attempts = self.retries + 1
         
         while result.attempts < max_attempts:
             result.attempts += 1
-            result.status = TaskStatus.RETRYING if result.attempts > 1 else TaskStatus.RUNNING
+            self._set_status(result, TaskStatus.RETRYING if result.attempts > 1 else TaskStatus.RUNNING)
             result.start_time = time.time()
             
             self.logger.info(f"{task.id}: {result.status.value}")
             
             try:
-                process = subprocess.Popen(
-                    task.run,
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1,
-                    universal_newlines=True
-                )
-                
+                prefix = f"  {task.id} | ".encode()
                 output_lines = []
-                for line in process.stdout:
-                    line = line.rstrip()
-                    if line:
-                        print(f"  {task.id} | {line}")
-                        output_lines.append(line)
                 
-                process.wait(timeout=3600)
-                result.output = '\n'.join(output_lines)
+                if self._tty:
+                    returncode = self._run_streaming(task, prefix, output_lines)
+                else:
+                    returncode = self._run_captured(task, prefix, output_lines)
+                
+                result.output = b'\n'.join(output_lines).decode('utf-8', 'replace')
                 result.error = ""
                 
-                if process.returncode == 0:
-                    result.status = TaskStatus.SUCCESS
+                if returncode == 0:
+                    self._set_status(result, TaskStatus.SUCCESS)
                     self.logger.info(f"{task.id}: done")
-                    self.save_state()
+                    self._log_delta(result)
                     return result
                 else:
-                    raise subprocess.CalledProcessError(process.returncode, task.run, 
+                    raise subprocess.CalledProcessError(returncode, task.run, 
                                                       result.output, "")
                     
             except subprocess.TimeoutExpired:
-                process.kill()
                 result.error = "timeout"
                 self.logger.error(f"{task.id}: timeout")
                 
@@ -133,38 +267,226 @@ class TaskExecutor:
                 result.error = str(e)
                 self.logger.error(f"{task.id}: error")
         
-        result.status = TaskStatus.FAILED
+        self._set_status(result, TaskStatus.FAILED)
         result.end_time = time.time()
-        self.save_state()
+        self._log_delta(result)
         return result
     
-    def execute_level(self, tasks: List[Task]) -> List[TaskResult]:
-        tasks_to_run = []
-        for task in tasks:
-            if task.id not in self.results or self.results[task.id].status != TaskStatus.SUCCESS:
-                tasks_to_run.append(task)
+    def _command(self, task: Task) -> Dict[str, Any]:
+        # Popen arguments for the task. Shell-free commands get the absolute
+        # path of the program, which subprocess needs before it will use
+        # posix_spawn (Python 3.13+ also does so with close_fds); builtins
+        # such as cd or exit have no executable and fall back to /bin/sh.
+        args, executable = task.run, None
+        argv = self._argv(task)
         
-        if not tasks_to_run:
-            return [self.results[task.id] for task in tasks]
+        if argv:
+            program = argv[0]
+            if program not in self._executables:
+                self._executables[program] = shutil.which(program)
+            if self._executables[program] is not None:
+                args, executable = argv, self._executables[program]
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks_to_run))) as executor:
-            future_to_task = {executor.submit(self.execute_task, task): task for task in tasks_to_run}
-            results = []
-            
-            for future in concurrent.futures.as_completed(future_to_task):
-                result = future.result()
-                results.append(result)
+        return dict(
+            args=args,
+            executable=executable,
+            shell=executable is None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+    
+    def _argv(self, task: Task) -> Optional[List[str]]:
+        # Split on first use and keep it per command line, so tasks that
+        # never run (or already succeeded) cost nothing at parse time.
+        if task.run not in self._argvs:
+            argv = None
+            if not _SHELL_META.search(task.run):
+                argv = shlex.split(task.run) or None
+            self._argvs[task.run] = argv
+        return self._argvs[task.run]
+    
+    def _spawn(self, start, task: Task, **kwargs):
+        try:
+            return start(**self._command(task), **kwargs)
+        except OSError as e:
+            argv = self._argv(task)
+            if e.errno != errno.ENOEXEC or not argv:
+                raise
+            # A script without a #! line: /bin/sh runs those as shell
+            # scripts, so send this program through the shell from now on.
+            self._executables[argv[0]] = None
+            return start(**self._command(task), **kwargs)
+    
+    def _run_streaming(self, task: Task, prefix: bytes, output_lines: List[bytes]) -> int:
+        process = self._spawn(subprocess.Popen, task, bufsize=0)
         
-        for task in tasks:
-            if task not in tasks_to_run:
-                results.append(self.results[task.id])
+        # The reader thread drains and echoes the pipe; this worker only
+        # waits for the process and then for its output to reach EOF.
+        drained = self._watch(process.stdout.fileno(), prefix, output_lines)
         
-        return results
+        try:
+            return process.wait(timeout=3600)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            raise
+        finally:
+            drained.wait()
+            process.stdout.close()
     
-    def get_status_summary(self) -> Dict:
-        summary = {status.value: 0 for status in TaskStatus}
+    def _watch(self, fd: int, prefix: bytes, output_lines: List[bytes]) -> threading.Event:
+        drained = threading.Event()
         
-        for result in self.results.values():
-            summary[result.status.value] += 1
+        with self._reader_lock:
+            if self._reader is None:
+                self._selector = selectors.DefaultSelector()
+                self._wake_r, self._wake_w = os.pipe()
+                self._selector.register(self._wake_r, selectors.EVENT_READ)
+                self._reader = threading.Thread(target=self._read_loop, daemon=True)
+                self._reader.start()
+        
+        # Registration happens on the reader thread; the wake pipe gets it
+        # out of select() to pick up the new fd.
+        self._watch_q.put((fd, (prefix, output_lines, bytearray(), drained)))
+        os.write(self._wake_w, b'\0')
+        return drained
+    
+    def _read_loop(self):
+        # One thread multiplexes the output pipes of every streaming task,
+        # instead of each worker blocking on its own read.
+        selector = self._selector
+        
+        while True:
+            for key, _ in selector.select():
+                if key.data is None:
+                    os.read(self._wake_r, 1 << 12)
+                    while True:
+                        try:
+                            watch = self._watch_q.get_nowait()
+                        except queue.Empty:
+                            break
+                        if watch is None:
+                            return
+                        selector.register(watch[0], selectors.EVENT_READ, watch[1])
+                    continue
+                
+                prefix, output_lines, buf, drained = key.data
+                
+                try:
+                    chunk = os.read(key.fd, 1 << 16)
+                    if chunk:
+                        buf += chunk
+                        end = buf.rfind(b'\n')
+                        if end >= 0:
+                            self._echo(prefix, bytes(buf[:end]).split(b'\n'), output_lines)
+                            del buf[:end + 1]
+                        continue
+                    self._echo(prefix, [bytes(buf)], output_lines)
+                except Exception:
+                    pass  # stop watching this task rather than hang its worker
+                
+                selector.unregister(key.fd)
+                drained.set()
+    
+    def _run_captured(self, task: Task, prefix: bytes, output_lines: List[bytes]) -> int:
+        # Nobody is watching live, so let subprocess drain the pipe and
+        # echo the task's output as one block once it exits.
+        try:
+            completed = self._spawn(subprocess.run, task, timeout=3600)
+        except subprocess.TimeoutExpired as e:
+            # run() has killed the task; still show what it printed.
+            self._echo(prefix, (e.stdout or b'').split(b'\n'), output_lines)
+            raise
+        
+        self._echo(prefix, completed.stdout.split(b'\n'), output_lines)
+        return completed.returncode
+    
+    def _echo(self, prefix: bytes, lines: List[bytes], output_lines: List[bytes]):
+        lines = [line for line in (line.rstrip() for line in lines) if line]
+        if not lines:
+            return
         
-        return summary
\ No newline at end of file
+        output_lines.extend(lines)
+        block = b''.join(prefix + line + b'\n' for line in lines)
+        
+        # Output is already kept on the result; a stdout that cannot take
+        # it (no binary buffer, closed, broken pipe) must not fail the task.
+        try:
+            with _stdout_lock:
+                stream = getattr(sys.stdout, 'buffer', None)
+                if stream is None:
+                    sys.stdout.write(block.decode('utf-8', 'replace'))
+                    sys.stdout.flush()
+                else:
+                    stream.write(block)
+                    stream.flush()
+        except (OSError, ValueError):
+            pass
+    
+    def submit(self, task: Task) -> concurrent.futures.Future:
+        return self.pool.submit(self.execute_task, task)
+    
+    def run_all(self, tasks: List[Task], graph: List[List[int]], in_degree: List[int]) -> int:
+        # Dispatch each task as soon as all of its dependencies succeed,
+        # instead of waiting for the whole level to finish. Tasks are
+        # referred to by their index in `tasks`, as in the scheduler's graph.
+        pending_deps = list(in_degree)
+        ready = [idx for idx, degree in enumerate(pending_deps) if degree == 0]
+        running = {}
+        blocked = set()
+        failed = 0
+        
+        while ready or running:
+            # Tasks that already succeeded in a resumed run are settled
+            # here rather than round-tripping through the pool. Results are
+            # created on this thread so workers never insert into
+            # self.results; each only mutates its own TaskResult.
+            # With no parallelism to gain (one worker, or a lone ready task
+            # and nothing in flight) tasks also run inline on this thread.
+            inline = self.max_workers == 1 or (len(ready) == 1 and not running)
+            finished = []
+            for idx in ready:
+                result = self._get_result(tasks[idx].id)
+                if result.status is _SUCCESS:
+                    finished.append(idx)
+                elif inline:
+                    self.execute_task(tasks[idx])
+                    finished.append(idx)
+                else:
+                    running[self.submit(tasks[idx])] = idx
+            ready = []
+            
+            if not finished:
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    future.result()
+                    finished.append(running.pop(future))
+            
+            for idx in finished:
+                if self.results[tasks[idx].id].status is not _SUCCESS:
+                    failed += 1
+                    self._block_dependents(idx, tasks, graph, blocked)
+                    continue
+                
+                for child in graph[idx]:
+                    pending_deps[child] -= 1
+                    if pending_deps[child] == 0 and child not in blocked:
+                        ready.append(child)
+        
+        return failed
+    
+    def _block_dependents(self, idx: int, tasks: List[Task], graph: List[List[int]], blocked: Set[int]):
+        stack = [idx]
+        
+        while stack:
+            parent = stack.pop()
+            for child in graph[parent]:
+                if child not in blocked:
+                    self.logger.error(f"{tasks[child].id}: blocked by {tasks[parent].id}")
+                    blocked.add(child)
+                    stack.append(child)
+    
+    def get_status_summary(self) -> Dict:
+        with self._status_lock:
+            return dict(self._status_counts)
\ No newline at end of file
@@ -1,10 +1,25 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 
 class FlowLogger:
+    _instances = {}
+    _listener = None
+    
+    def __new__(cls, log_file="flow.log"):
+        # One instance per log file, so handlers and the file are set up once.
+        if log_file not in cls._instances:
+            cls._instances[log_file] = super().__new__(cls)
+        return cls._instances[log_file]
+    
     def __init__(self, log_file="flow.log"):
+        if hasattr(self, 'logger'):
+            return
+        
         self.log_file = Path(log_file)
         self.setup_logging()
     
@@ -17,13 +32,36 @@ class FlowLogger:
         console_formatter = logging.Formatter('%(message)s')
         console_handler.setFormatter(console_formatter)
         
+        # Only the file write goes through the listener thread. Console
+        # lines stay on the calling thread so they keep their order with
+        # task output, which executor threads write to stdout directly.
+        log_queue = queue.SimpleQueue()
+        self._listener = QueueListener(log_queue, file_handler)
+        self._listener.start()
+        atexit.register(self.close)
+        
+        # Another log file's instance may own the 'flow' logger's handlers;
+        # stop its listener and file too rather than leave them to exit.
+        for instance in self._instances.values():
+            if instance is not self:
+                instance.close()
+        
         self.logger = logging.getLogger('flow')
         self.logger.setLevel(logging.INFO)
+        for handler in self.logger.handlers:
+            handler.close()
         self.logger.handlers.clear()
-        self.logger.addHandler(file_handler)
+        self.logger.addHandler(QueueHandler(log_queue))
         self.logger.addHandler(console_handler)
         self.logger.propagate = False
     
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+    
     def info(self, msg):
         self.logger.info(msg)
     
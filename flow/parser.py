@@ -1,10 +1,24 @@
+import io
+import sys
 import yaml
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
 
-@dataclass
+_NULLS = {'', '~', 'null', 'Null', 'NULL'}
+_RESOLVER = yaml.resolver.Resolver()
+
+
+class _Fallback(Exception):
+    pass
+
+
+@dataclass(slots=True)
 class Task:
     id: str
     run: str
@@ -26,39 +40,236 @@ class PipelineParser:
             raise FileNotFoundError(f"file not found: {pipeline_file}")
         
         try:
-            with open(pipeline_path, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-            
-            if 'tasks' not in data:
-                raise ValueError("no tasks found")
-            
-            tasks = []
-            task_ids = set()
-            
-            for task_data in data['tasks']:
-                if 'id' not in task_data or 'run' not in task_data:
-                    raise ValueError("task missing id or run")
-                
-                task_id = task_data['id']
-                if task_id in task_ids:
-                    raise ValueError(f"duplicate task: {task_id}")
-                
-                task_ids.add(task_id)
-                
-                task = Task(
-                    id=task_id,
-                    run=task_data['run'],
-                    depends_on=task_data.get('depends_on', [])
-                )
-                tasks.append(task)
+            # Read the file in one call; the loader only reparses it when
+            # the event walk hits something it does not model.
+            data = pipeline_path.read_bytes()
+            self._quoted = set()
+            try:
+                tasks = self._parse_events(yaml.parse(self._stream(data, pipeline_path), Loader=_Loader))
+            except _Fallback:
+                self._quoted = set()
+                tasks = self._parse_nodes(yaml.compose(self._stream(data, pipeline_path), Loader=_Loader))
             
+            task_ids = {task.id for task in tasks}
+            by_value = None
             for task in tasks:
-                for dep in task.depends_on:
-                    if dep not in task_ids:
+                for i, dep in enumerate(task.depends_on):
+                    if dep in task_ids:
+                        continue
+                    # Ids keep their spelling, but plain 1 and 01 are the
+                    # same YAML value, so match them the way loaded values did.
+                    if by_value is None:
+                        by_value = self._ids_by_value(tasks)
+                    match = None if dep is None else by_value.get(self._value(dep))
+                    if match is None:
                         raise ValueError(f"task {task.id} depends on missing {dep}")
+                    task.depends_on[i] = match
             
             self.logger.info(f"loaded {len(tasks)} tasks")
             return tasks
             
         except yaml.YAMLError as e:
-            raise ValueError(f"bad yaml: {e}")
\ No newline at end of file
+            raise ValueError(f"bad yaml: {e}")
+    
+    def _stream(self, data: bytes, pipeline_path: Path) -> io.BytesIO:
+        # The name keeps error marks pointing at the pipeline file
+        # instead of "<byte string>".
+        stream = io.BytesIO(data)
+        stream.name = str(pipeline_path)
+        return stream
+    
+    def _ids_by_value(self, tasks: List[Task]) -> Dict[Any, str]:
+        by_value = {}
+        for task in tasks:
+            by_value.setdefault(self._value(task.id), task.id)
+        return by_value
+    
+    def _value(self, text: str) -> Any:
+        if text in self._quoted:
+            return text
+        node = yaml.ScalarNode(_RESOLVER.resolve(yaml.ScalarNode, text, (True, False)), text)
+        try:
+            return yaml.constructor.SafeConstructor().construct_object(node)
+        except (ValueError, yaml.YAMLError):
+            return text
+    
+    def _parse_nodes(self, root: Optional[yaml.Node]) -> List[Task]:
+        # Same rules as the event walk, over the composed document, so
+        # aliases and merge keys resolve while ids keep their spelling.
+        fields = self._node_fields(root) if isinstance(root, yaml.MappingNode) else {}
+        if not isinstance(fields.get('tasks'), yaml.SequenceNode):
+            raise ValueError("no tasks found")
+        
+        tasks = []
+        task_ids = set()
+        
+        for task_node in fields['tasks'].value:
+            if not isinstance(task_node, yaml.MappingNode):
+                raise ValueError("task missing id or run")
+            
+            task_data = self._node_fields(task_node)
+            task_id = self._node_scalar(task_data.get('id'))
+            run = self._node_scalar(task_data.get('run'))
+            if task_id is None or run is None:
+                raise ValueError("task missing id or run")
+            
+            task_id = sys.intern(task_id)
+            if task_id in task_ids:
+                raise ValueError(f"duplicate task: {task_id}")
+            
+            deps_node = task_data.get('depends_on')
+            if isinstance(deps_node, yaml.SequenceNode):
+                depends_on = [self._node_scalar(node) for node in deps_node.value]
+                depends_on = [dep if dep is None else sys.intern(dep) for dep in depends_on]
+            else:
+                dep = self._node_scalar(deps_node)
+                depends_on = [] if dep is None else [sys.intern(dep)]
+            
+            task_ids.add(task_id)
+            tasks.append(Task(id=task_id, run=run, depends_on=depends_on))
+        
+        return tasks
+    
+    def _node_fields(self, node: yaml.MappingNode) -> Dict[str, yaml.Node]:
+        yaml.constructor.SafeConstructor().flatten_mapping(node)
+        return {key.value: value for key, value in node.value if isinstance(key, yaml.ScalarNode)}
+    
+    def _node_scalar(self, node: Optional[yaml.Node]) -> Optional[str]:
+        if node is None:
+            return None
+        if not isinstance(node, yaml.ScalarNode):
+            raise ValueError("expected a plain value")
+        # Plain scalars have no style (None, or '' from the C composer).
+        if not node.style and node.value in _NULLS:
+            return None
+        if node.style:
+            self._quoted.add(node.value)
+        return node.value
+    
+    def _parse_events(self, events: Iterator[yaml.Event]) -> List[Task]:
+        # Walk the parser events directly instead of composing the whole
+        # document; only id, run and depends_on of each task are kept.
+        # Anything the walk does not model (aliases, merge keys, more than
+        # one document) goes through the full loader instead.
+        events = self._check_supported(events)
+        
+        for event in events:
+            if isinstance(event, yaml.DocumentStartEvent):
+                break
+        
+        root = next(events, None)
+        if not isinstance(root, yaml.MappingStartEvent):
+            raise ValueError("no tasks found")
+        
+        tasks = None
+        for key, value in self._iter_mapping(events):
+            if key == 'tasks' and isinstance(value, yaml.SequenceStartEvent):
+                tasks = self._read_tasks(events)
+            else:
+                self._skip_node(events, value)
+        
+        if tasks is None:
+            raise ValueError("no tasks found")
+        
+        # Drain the rest so syntax errors further down are still reported.
+        for event in events:
+            if isinstance(event, yaml.DocumentStartEvent):
+                raise _Fallback
+        
+        return tasks
+    
+    def _check_supported(self, events: Iterator[yaml.Event]) -> Iterator[yaml.Event]:
+        for event in events:
+            if isinstance(event, yaml.AliasEvent):
+                raise _Fallback
+            if isinstance(event, yaml.ScalarEvent) and event.value == '<<' and event.implicit[0]:
+                raise _Fallback
+            yield event
+    
+    def _read_tasks(self, events: Iterator[yaml.Event]) -> List[Task]:
+        tasks = []
+        append = tasks.append
+        task_ids = set()
+        
+        for event in events:
+            if isinstance(event, yaml.SequenceEndEvent):
+                return tasks
+            
+            if not isinstance(event, yaml.MappingStartEvent):
+                raise ValueError("task missing id or run")
+            
+            task_data = {}
+            for key, value in self._iter_mapping(events):
+                if key in ('id', 'run'):
+                    task_data[key] = self._read_scalar(events, value)
+                elif key == 'depends_on':
+                    task_data[key] = self._read_depends_on(events, value)
+                else:
+                    self._skip_node(events, value)
+            
+            if task_data.get('id') is None or task_data.get('run') is None:
+                raise ValueError("task missing id or run")
+            
+            task_id = sys.intern(task_data['id'])
+            if task_id in task_ids:
+                raise ValueError(f"duplicate task: {task_id}")
+            
+            task_ids.add(task_id)
+            append(Task(
+                id=task_id,
+                run=task_data['run'],
+                depends_on=task_data.get('depends_on', [])
+            ))
+        
+        return tasks
+    
+    def _iter_mapping(self, events: Iterator[yaml.Event]) -> Iterator[Tuple[Any, yaml.Event]]:
+        for event in events:
+            if isinstance(event, yaml.MappingEndEvent):
+                return
+            
+            if isinstance(event, yaml.ScalarEvent):
+                key = event.value
+            else:
+                self._skip_node(events, event)
+                key = None
+            
+            yield key, next(events)
+    
+    def _read_depends_on(self, events: Iterator[yaml.Event], event: yaml.Event) -> List[str]:
+        if not isinstance(event, yaml.SequenceStartEvent):
+            dep = self._read_scalar(events, event)
+            return [] if dep is None else [sys.intern(dep)]
+        
+        deps = []
+        for event in events:
+            if isinstance(event, yaml.SequenceEndEvent):
+                return deps
+            dep = self._read_scalar(events, event)
+            deps.append(dep if dep is None else sys.intern(dep))
+        
+        return deps
+    
+    def _read_scalar(self, events: Iterator[yaml.Event], event: yaml.Event) -> Optional[str]:
+        if isinstance(event, yaml.ScalarEvent):
+            if event.implicit[0] and event.value in _NULLS:
+                return None
+            if not event.implicit[0]:
+                self._quoted.add(event.value)
+            return event.value
+        
+        self._skip_node(events, event)
+        raise ValueError("expected a plain value")
+    
+    def _skip_node(self, events: Iterator[yaml.Event], event: yaml.Event):
+        if not isinstance(event, yaml.CollectionStartEvent):
+            return
+        
+        depth = 1
+        for event in events:
+            if isinstance(event, yaml.CollectionStartEvent):
+                depth += 1
+            elif isinstance(event, yaml.CollectionEndEvent):
+                depth -= 1
+                if depth == 0:
+                    return
\ No newline at end of file
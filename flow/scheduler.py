@@ -1,6 +1,5 @@
-from typing import List, Set, Dict
-from collections import defaultdict, deque
-from parser import Task
+from typing import List, Dict, Optional, Tuple
+from flow.parser import Task
 
 
 class TaskScheduler:
@@ -8,75 +7,73 @@ class TaskScheduler:
         self.logger = logger
     
     def build_dependency_graph(self, tasks: List[Task]) -> Dict[str, List[str]]:
-        graph = defaultdict(list)
+        graph = {task.id: [] for task in tasks}
         
         for task in tasks:
             for dep in task.depends_on:
                 graph[dep].append(task.id)
         
-        return dict(graph)
+        return graph
     
-    def detect_cycles(self, tasks: List[Task]) -> bool:
-        graph = defaultdict(list)
-        in_degree = defaultdict(int)
+    def get_graph_and_indegree(self, tasks: List[Task]) -> Tuple[List[List[int]], List[int]]:
+        # Work on list positions rather than ids so traversals are plain
+        # list indexing; ids are only looked up again for output.
+        id_to_idx = {task.id: idx for idx, task in enumerate(tasks)}
+        graph = [[] for _ in tasks]
+        in_degree = [0] * len(tasks)
         
-        for task in tasks:
-            in_degree[task.id] = 0
-        
-        for task in tasks:
+        for idx, task in enumerate(tasks):
+            in_degree[idx] = len(task.depends_on)
             for dep in task.depends_on:
-                graph[dep].append(task.id)
-                in_degree[task.id] += 1
+                graph[id_to_idx[dep]].append(idx)
         
-        queue = deque([task_id for task_id, degree in in_degree.items() if degree == 0])
+        return graph, in_degree
+    
+    def plan(self, tasks: List[Task], graph: Optional[List[List[int]]] = None,
+             in_degree: Optional[List[int]] = None,
+             with_levels: bool = True) -> Tuple[List[List[str]], bool]:
+        # Callers that already hold the graph pass it in; in_degree is
+        # copied because the pass below consumes it. A cycle check alone
+        # skips building the id lists for each level.
+        if graph is None:
+            graph, in_degree = self.get_graph_and_indegree(tasks)
+        else:
+            in_degree = list(in_degree)
+        
+        levels = []
         processed = 0
+        current = [idx for idx, degree in enumerate(in_degree) if degree == 0]
         
-        while queue:
-            current = queue.popleft()
-            processed += 1
+        while current:
+            if with_levels:
+                levels.append([tasks[idx].id for idx in current])
+            processed += len(current)
             
-            for neighbor in graph[current]:
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
+            next_level = []
+            for idx in current:
+                for neighbor in graph[idx]:
+                    in_degree[neighbor] -= 1
+                    if in_degree[neighbor] == 0:
+                        next_level.append(neighbor)
+            current = next_level
         
-        has_cycle = processed != len(tasks)
+        return levels, processed != len(tasks)
+    
+    def detect_cycles(self, tasks: List[Task], graph: Optional[List[List[int]]] = None,
+                      in_degree: Optional[List[int]] = None) -> bool:
+        _, has_cycle = self.plan(tasks, graph, in_degree, with_levels=False)
         
         if has_cycle:
             self.logger.error("cycle detected")
         
         return has_cycle
     
-    def get_execution_order(self, tasks: List[Task]) -> List[List[str]]:
-        if self.detect_cycles(tasks):
-            raise ValueError("cyclic dependencies")
-        
-        graph = defaultdict(list)
-        in_degree = defaultdict(int)
-        
-        for task in tasks:
-            in_degree[task.id] = 0
+    def get_execution_order(self, tasks: List[Task], graph: Optional[List[List[int]]] = None,
+                            in_degree: Optional[List[int]] = None) -> List[List[str]]:
+        levels, has_cycle = self.plan(tasks, graph, in_degree)
         
-        for task in tasks:
-            for dep in task.depends_on:
-                graph[dep].append(task.id)
-                in_degree[task.id] += 1
-        
-        levels = []
-        remaining_tasks = set(task.id for task in tasks)
-        
-        while remaining_tasks:
-            current_level = [task_id for task_id in remaining_tasks 
-                           if in_degree[task_id] == 0]
-            
-            if not current_level:
-                raise ValueError("unresolvable dependencies")
-            
-            levels.append(current_level)
-            
-            for task_id in current_level:
-                remaining_tasks.remove(task_id)
-                for neighbor in graph[task_id]:
-                    in_degree[neighbor] -= 1
+        if has_cycle:
+            self.logger.error("cycle detected")
+            raise ValueError("cyclic dependencies")
         
         return levels
\ No newline at end of file
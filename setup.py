@@ -8,6 +8,9 @@ setup(
         "click>=8.0.0",
         "pyyaml>=6.0",
     ],
+    extras_require={
+        "fast": ["orjson>=3.0"],
+    },
     entry_points={
         "console_scripts": [
             "flow=flow.cli:cli",